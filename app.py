@@ -4,8 +4,18 @@ import requests
 import json
 import time
 import streamlit.components.v1 as components
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import queue
 import psycopg2
-from psycopg2 import pool
+from psycopg2 import pool, extensions
+from contextlib import contextmanager
 import smtplib
 from email.message import EmailMessage
 import random
@@ -13,6 +23,10 @@ import string
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 import bcrypt
+from postprocess import clean_translation
+from caching import MISSING, UserCache, SessionStore, approx_size
+
+logger = logging.getLogger(__name__)
 
 # -------------------- APP CONFIG --------------------
 st.set_page_config(
@@ -222,27 +236,206 @@ except Exception as e:
     st.error("Missing required secrets. Please add DB and SMTP settings to Streamlit secrets.")
     st.stop()
 
+# Overridable so loadtest.py can point the app at local stand-ins
+SMTP_STARTTLS = str(st.secrets.get("SMTP_STARTTLS", "true")).strip().lower() not in ("0", "false", "no")
+OPENROUTER_URL = st.secrets.get("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+
 # -------------------- DB CONNECTION POOL --------------------
-if "db_pool" not in st.session_state:
-    try:
-        st.session_state.db_pool = pool.ThreadedConnectionPool(
-            minconn=1,
-            maxconn=10,
-            user=POSTGRES_USER,
-            password=POSTGRES_PASSWORD,
-            host=POSTGRES_HOST,
-            port=POSTGRES_PORT,
-            database=POSTGRES_DB
-        )
-    except Exception as e:
-        st.error(f"Failed to initialize DB pool: {e}")
-        st.stop()
+DB_STATEMENT_TIMEOUT_MS = int(st.secrets.get("DB_STATEMENT_TIMEOUT_MS", 5000))
+DB_POOL_MAXCONN = int(st.secrets.get("DB_POOL_MAXCONN", 20))
+DB_POOL_WAIT_SECONDS = float(st.secrets.get("DB_POOL_WAIT_SECONDS", 10))
+
+class PreparingConnection(extensions.connection):
+    # Remembers which named statements have been PREPAREd on this server session
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+# One pool per server process, shared by every session
+@st.cache_resource
+def get_db_pool():
+    return pool.ThreadedConnectionPool(
+        minconn=1,
+        maxconn=DB_POOL_MAXCONN,
+        user=POSTGRES_USER,
+        password=POSTGRES_PASSWORD,
+        host=POSTGRES_HOST,
+        port=POSTGRES_PORT,
+        database=POSTGRES_DB,
+        connection_factory=PreparingConnection,
+        options=f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    )
+
+try:
+    get_db_pool()
+except Exception as e:
+    st.error(f"Failed to initialize DB pool: {e}")
+    st.stop()
+
+# ThreadedConnectionPool raises instead of waiting when every connection is out,
+# so callers queue on a semaphore sized to the pool first.
+@st.cache_resource
+def get_db_slots():
+    return threading.BoundedSemaphore(DB_POOL_MAXCONN)
+
+DB_BUSY_MESSAGE = "The server is busy right now. Please retry in a few seconds."
+
+class DatabaseBusyError(pool.PoolError):
+    pass
 
 def get_conn():
-    return st.session_state.db_pool.getconn()
+    slots = get_db_slots()
+    if not slots.acquire(timeout=DB_POOL_WAIT_SECONDS):
+        raise DatabaseBusyError("connection pool exhausted")
+    try:
+        return get_db_pool().getconn()
+    except Exception:
+        slots.release()
+        raise
 
 def release_conn(conn):
-    st.session_state.db_pool.putconn(conn)
+    try:
+        get_db_pool().putconn(conn, close=bool(conn.closed))
+    finally:
+        get_db_slots().release()
+
+# -------------------- QUERY LAYER --------------------
+# name -> (parameter types, SQL). Each is PREPAREd once per connection and run with EXECUTE.
+PREPARED_STATEMENTS = {
+    "insert_otp": (
+        "text, text, text, timestamptz",
+        "INSERT INTO otps (email, otp, purpose, expires_at, consumed) VALUES ($1, $2, $3, $4, FALSE)"
+    ),
+    "find_otp": (
+        "text, text, text",
+        "SELECT id, expires_at, consumed FROM otps WHERE email = $1 AND otp = $2 AND purpose = $3 "
+        "ORDER BY created_at DESC LIMIT 1"
+    ),
+    "consume_otp": (
+        "integer",
+        "UPDATE otps SET consumed = TRUE WHERE id = $1"
+    ),
+    "insert_user": (
+        "text, text",
+        "INSERT INTO users (email, password_hash, is_verified) VALUES ($1, $2, TRUE) RETURNING id"
+    ),
+    "get_user_by_email": (
+        "text",
+        "SELECT id, email, password_hash, is_verified FROM users WHERE email = $1"
+    ),
+    "update_user_password": (
+        "text, text",
+        "UPDATE users SET password_hash = $1 WHERE email = $2"
+    ),
+    "insert_translation": (
+        "text, text, text, text, text",
+        "INSERT INTO humor_translations (user_email, original_text, target_culture, translated_text, model_used) "
+        "VALUES ($1, $2, $3, $4, $5)"
+    ),
+    "get_user_translations": (
+        "text, integer",
+        "SELECT id, original_text, target_culture, translated_text, model_used, created_at "
+        "FROM humor_translations WHERE user_email = $1 ORDER BY created_at DESC LIMIT $2"
+    ),
+    # (input, culture) pairs requested by the most distinct users, each with its most common translation
+    "trending_translations": (
+        "text[], integer, integer, integer, text",
+        "WITH normalized AS ("
+        "  SELECT lower(trim(regexp_replace(original_text, '\\s+', ' ', 'g'))) AS norm_input,"
+        "         lower(trim(target_culture)) AS norm_culture,"
+        "         user_email, original_text, target_culture, translated_text, model_used, created_at"
+        "  FROM humor_translations"
+        "  WHERE lower(trim(target_culture)) = ANY($1)"
+        "    AND translated_text IS NOT NULL"
+        "    AND model_used IS DISTINCT FROM $5"  # cache hits must not vote for themselves
+        "    AND created_at > NOW() - $2 * INTERVAL '1 day'"
+        "), pairs AS ("
+        "  SELECT norm_input, norm_culture, COUNT(DISTINCT user_email) AS users, COUNT(*) AS uses"
+        "  FROM normalized"
+        "  GROUP BY norm_input, norm_culture HAVING COUNT(DISTINCT user_email) >= $3"  # one user retrying is not a trend
+        "  ORDER BY users DESC, uses DESC LIMIT $4"
+        "), best AS ("
+        "  SELECT DISTINCT ON (n.norm_input, n.norm_culture)"
+        "         n.norm_input, n.norm_culture, n.translated_text,"
+        "         (array_agg(n.model_used ORDER BY n.created_at DESC))[1] AS model_used,"
+        "         (array_agg(n.original_text ORDER BY n.created_at DESC))[1] AS original_text,"
+        "         (array_agg(n.target_culture ORDER BY n.created_at DESC))[1] AS target_culture"
+        "  FROM normalized n JOIN pairs p USING (norm_input, norm_culture)"
+        "  GROUP BY n.norm_input, n.norm_culture, n.translated_text"
+        "  ORDER BY n.norm_input, n.norm_culture, COUNT(*) DESC, MAX(n.created_at) DESC"
+        ") "
+        "SELECT b.norm_input, b.norm_culture, b.original_text, b.target_culture,"
+        "       b.translated_text, b.model_used, p.users "
+        "FROM best b JOIN pairs p USING (norm_input, norm_culture) ORDER BY p.users DESC, p.uses DESC"
+    ),
+}
+
+class QueryStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}  # name -> [calls, errors, total_ms, max_ms]
+
+    def record(self, name, elapsed_ms, ok):
+        with self.lock:
+            entry = self.stats.setdefault(name, [0, 0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += 0 if ok else 1
+            entry[2] += elapsed_ms
+            entry[3] = max(entry[3], elapsed_ms)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: {
+                    "calls": calls,
+                    "errors": errors,
+                    "avg_ms": round(total / calls, 2) if calls else 0.0,
+                    "max_ms": round(max_ms, 2)
+                }
+                for name, (calls, errors, total, max_ms) in self.stats.items()
+            }
+
+@st.cache_resource
+def get_query_stats():
+    return QueryStats()
+
+@contextmanager
+def db_cursor(stop_when_busy=True):
+    # Connection is always returned to the pool; the transaction commits on success.
+    # Callers that report their own errors pass stop_when_busy=False to get DatabaseBusyError.
+    try:
+        conn = get_conn()
+    except DatabaseBusyError:
+        if not stop_when_busy or get_script_run_ctx() is None:
+            raise  # background threads handle their own failures
+        st.warning(f"⏳ {DB_BUSY_MESSAGE}")
+        st.stop()
+    try:
+        with conn.cursor() as cur:
+            yield cur
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        release_conn(conn)
+
+def run_query(cur, name, params=()):
+    conn = cur.connection
+    types, sql = PREPARED_STATEMENTS[name]
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} ({types}) AS {sql};")
+        conn.prepared.add(name)
+
+    args = f" ({', '.join(['%s'] * len(params))})" if params else ""
+    start = time.perf_counter()
+    ok = False
+    try:
+        cur.execute(f"EXECUTE {name}{args};", params)
+        ok = True
+    finally:
+        get_query_stats().record(name, (time.perf_counter() - start) * 1000, ok)
 
 # -------------------- PASSWORD HASH - SIMPLIFIED --------------------
 def hash_password(password):
@@ -273,42 +466,38 @@ def verify_password(plain, hashed):
 
 # -------------------- DB SCHEMA (run once) --------------------
 def ensure_tables():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id SERIAL PRIMARY KEY,
-        email TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        is_verified BOOLEAN DEFAULT FALSE,
-        created_at TIMESTAMP DEFAULT NOW()
-    );
-    """)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS otps (
-        id SERIAL PRIMARY KEY,
-        email TEXT NOT NULL,
-        otp TEXT NOT NULL,
-        purpose TEXT NOT NULL, -- signup | reset
-        expires_at TIMESTAMP NOT NULL,
-        consumed BOOLEAN DEFAULT FALSE,
-        created_at TIMESTAMP DEFAULT NOW()
-    );
-    """)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS humor_translations (
-        id SERIAL PRIMARY KEY,
-        user_email TEXT NOT NULL,
-        original_text TEXT,
-        target_culture TEXT,
-        translated_text TEXT,
-        model_used TEXT,
-        created_at TIMESTAMP DEFAULT NOW()
-    );
-    """)
-    conn.commit()
-    cur.close()
-    release_conn(conn)
+    with db_cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            is_verified BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+        """)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS otps (
+            id SERIAL PRIMARY KEY,
+            email TEXT NOT NULL,
+            otp TEXT NOT NULL,
+            purpose TEXT NOT NULL, -- signup | reset
+            expires_at TIMESTAMP NOT NULL,
+            consumed BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+        """)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS humor_translations (
+            id SERIAL PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            original_text TEXT,
+            target_culture TEXT,
+            translated_text TEXT,
+            model_used TEXT,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+        """)
 
 ensure_tables()
 
@@ -329,7 +518,8 @@ def send_email_async(to_email, subject, body):
         msg.set_content(body)
 
         with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
-            smtp.starttls()
+            if SMTP_STARTTLS:
+                smtp.starttls()
             smtp.login(SMTP_USER, SMTP_PASSWORD)
             smtp.send_message(msg)
         return True, None
@@ -339,15 +529,8 @@ def send_email_async(to_email, subject, body):
 def create_and_send_otp(email, purpose="signup"):
     otp = gen_otp()
     expires_at = datetime.now(timezone.utc) + timedelta(minutes=OTP_TTL_MINUTES)
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO otps (email, otp, purpose, expires_at, consumed)
-        VALUES (%s, %s, %s, %s, FALSE);
-    """, (email, otp, purpose, expires_at))
-    conn.commit()
-    cur.close()
-    release_conn(conn)
+    with db_cursor() as cur:
+        run_query(cur, "insert_otp", (email, otp, purpose, expires_at))
 
     subject = "Your Cross-Culture Humor Mapper OTP"
     body = f"Your OTP for {purpose} is: {otp}\nIt expires in {OTP_TTL_MINUTES} minutes.\nIf you did not request this, ignore."
@@ -355,106 +538,84 @@ def create_and_send_otp(email, purpose="signup"):
     ok, err = send_email_async(email, subject, body)
     return ok, err
 
-def verify_otp(email, otp_value, purpose="signup"):
+def verify_otp(email, otp_value, purpose="signup", on_success=None):
+    # on_success(cur) runs in the same transaction, so the OTP is only consumed
+    # if the change it authorizes is written too
     now = datetime.now(timezone.utc)
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id, expires_at, consumed FROM otps
-        WHERE email = %s AND otp = %s AND purpose = %s
-        ORDER BY created_at DESC
-        LIMIT 1;
-    """, (email, otp_value, purpose))
-    row = cur.fetchone()
-    if not row:
-        cur.close()
-        release_conn(conn)
-        return False, "OTP not found."
-    otp_id, expires_at, consumed = row
-    
-    # Ensure both datetimes are timezone-aware for comparison
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
-    
-    if consumed:
-        cur.close()
-        release_conn(conn)
-        return False, "OTP already used."
-    if expires_at < now:
-        cur.close()
-        release_conn(conn)
-        return False, "OTP expired."
-    # mark consumed
-    cur.execute("UPDATE otps SET consumed = TRUE WHERE id = %s;", (otp_id,))
-    conn.commit()
-    cur.close()
-    release_conn(conn)
+    with db_cursor(stop_when_busy=False) as cur:
+        run_query(cur, "find_otp", (email, otp_value, purpose))
+        row = cur.fetchone()
+        if not row:
+            return False, "OTP not found."
+        otp_id, expires_at, consumed = row
+
+        # Ensure both datetimes are timezone-aware for comparison
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+
+        if consumed:
+            return False, "OTP already used."
+        if expires_at < now:
+            return False, "OTP expired."
+        if on_success:
+            on_success(cur)
+        # mark consumed
+        run_query(cur, "consume_otp", (otp_id,))
     return True, None
 
+# -------------------- USER CACHE --------------------
+USER_CACHE_TTL_SECONDS = int(st.secrets.get("USER_CACHE_TTL_SECONDS", 300))
+USER_CACHE_NEGATIVE_TTL_SECONDS = int(st.secrets.get("USER_CACHE_NEGATIVE_TTL_SECONDS", 30))
+USER_CACHE_MAX_ENTRIES = int(st.secrets.get("USER_CACHE_MAX_ENTRIES", 10000))
+
+@st.cache_resource
+def get_user_cache():
+    return UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_NEGATIVE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)
+
 # -------------------- USER MANAGEMENT --------------------
-def create_user(email, password):
+def create_user(email, password, otp_value):
     password_hash = hash_password(password)
-    conn = get_conn()
-    cur = conn.cursor()
     try:
-        cur.execute("""
-            INSERT INTO users (email, password_hash, is_verified)
-            VALUES (%s, %s, TRUE) RETURNING id;
-        """, (email, password_hash))
-        conn.commit()
-        cur.close()
-        release_conn(conn)
-        return True, None
+        return verify_otp(email, otp_value, "signup", lambda cur: run_query(cur, "insert_user", (email, password_hash)))
+    except DatabaseBusyError:
+        return False, DB_BUSY_MESSAGE
     except Exception as e:
-        conn.rollback()
-        cur.close()
-        release_conn(conn)
         return False, str(e)
+    finally:
+        get_user_cache().invalidate(email)
 
 def get_user_by_email(email):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, email, password_hash, is_verified FROM users WHERE email = %s;", (email,))
-    row = cur.fetchone()
-    cur.close()
-    release_conn(conn)
+    cache = get_user_cache()
+    row = cache.get(email)
+    if row is not MISSING:
+        return row
+    version = cache.version(email)
+    with db_cursor() as cur:
+        run_query(cur, "get_user_by_email", (email,))
+        row = cur.fetchone()
+    cache.put(email, row, version)
     return row
 
-def update_user_password(email, new_password):
+def update_user_password(email, new_password, otp_value):
     new_hash = hash_password(new_password)
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET password_hash = %s WHERE email = %s;", (new_hash, email))
-    conn.commit()
-    cur.close()
-    release_conn(conn)
+    try:
+        return verify_otp(email, otp_value, "reset", lambda cur: run_query(cur, "update_user_password", (new_hash, email)))
+    except DatabaseBusyError:
+        return False, DB_BUSY_MESSAGE
+    except Exception as e:
+        return False, str(e)
+    finally:
+        get_user_cache().invalidate(email)
 
 # -------------------- TRANSLATION STORAGE --------------------
 def save_translation_db(user_email, original_text, target_culture, translated_text, model_used):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO humor_translations (user_email, original_text, target_culture, translated_text, model_used)
-        VALUES (%s, %s, %s, %s, %s);
-    """, (user_email, original_text, target_culture, translated_text, model_used))
-    conn.commit()
-    cur.close()
-    release_conn(conn)
+    with db_cursor() as cur:
+        run_query(cur, "insert_translation", (user_email, original_text, target_culture, translated_text, model_used))
 
 def get_user_translations_db(user_email, limit=50):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id, original_text, target_culture, translated_text, model_used, created_at
-        FROM humor_translations
-        WHERE user_email = %s
-        ORDER BY created_at DESC
-        LIMIT %s;
-    """, (user_email, limit))
-    rows = cur.fetchall()
-    cur.close()
-    release_conn(conn)
-    return rows
+    with db_cursor() as cur:
+        run_query(cur, "get_user_translations", (user_email, limit))
+        return cur.fetchall()
 
 FREE_MODELS = [
     "mistralai/mistral-7b-instruct:free",           # This definitely works
@@ -463,13 +624,16 @@ FREE_MODELS = [
 ]
 
 # -------------------- SMART TRANSLATE FUNCTION --------------------
-def smart_translate_humor(input_text, target_culture, max_attempts=3):
-    prompt = (
+def build_prompt(input_text, target_culture):
+    return (
         f"Translate or adapt the following joke or phrase into humor suitable for {target_culture} culture. "
         f"Maintain the spirit of the joke and make it funny and understandable to that culture.\n\n"
         f"Input: {input_text}\n\nTranslated Humor:"
     )
 
+def smart_translate_humor(input_text, target_culture, max_attempts=3):
+    prompt = build_prompt(input_text, target_culture)
+
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json"
@@ -493,7 +657,7 @@ def smart_translate_humor(input_text, target_culture, max_attempts=3):
             }
 
             response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
+                OPENROUTER_URL,
                 headers=headers,
                 data=json.dumps(body),
                 timeout=30
@@ -502,13 +666,16 @@ def smart_translate_humor(input_text, target_culture, max_attempts=3):
             if response.status_code == 200:
                 data = response.json()
                 if "choices" in data:
-                    translated_text = data["choices"][0]["message"]["content"]
-                    if len(translated_text.strip()) > 10:
+                    raw_text = data["choices"][0]["message"]["content"]
+                    translated_text, reason = clean_translation(raw_text, prompt, input_text)
+                    if translated_text:
                         if max_attempts > 1:
                             st.success(f"✅ **Success with {model_name}!**")
                         return translated_text, model, attempts
-                    else:
-                        st.warning(f"❌ {model_name} returned empty response")
+                    # A bad answer is not a rate limit: move straight on to the next model
+                    st.warning(f"❌ {model_name} returned an unusable response ({reason})")
+                    attempts.append(f"Attempt {i+1}: {model_name} - Rejected ({reason})")
+                    continue
 
             else:
                 error_msg = f"HTTP {response.status_code}"
@@ -534,6 +701,418 @@ def smart_translate_humor(input_text, target_culture, max_attempts=3):
 
     return None, None, attempts
 
+# -------------------- TEXT-TO-SPEECH --------------------
+# Optional offline backend: set TTS_BACKEND = "pyttsx3" in secrets and `pip install pyttsx3`.
+# Rendered clips are transcoded to Opus when ffmpeg is on PATH and kept in a
+# content-addressed disk cache, so replaying a popular translation is a file read.
+TTS_BACKEND = str(st.secrets.get("TTS_BACKEND", "browser")).strip().lower()  # browser | pyttsx3
+TTS_CACHE_DIR = st.secrets.get("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "humor_tts_cache"))
+TTS_CACHE_MAX_MB = int(st.secrets.get("TTS_CACHE_MAX_MB", 200))
+TTS_AUDIO_FORMATS = {"ogg": "audio/ogg", "wav": "audio/wav"}
+TTS_QUEUE_MAX = int(st.secrets.get("TTS_QUEUE_MAX", 100))
+TTS_POLL_INTERVAL_SECONDS = 2
+TTS_POLL_MAX_SECONDS = int(st.secrets.get("TTS_POLL_MAX_SECONDS", 90))
+
+TTS_LANG_MAP = {
+    "indian": "hi-IN",
+    "hindi": "hi-IN",
+    "japanese": "ja-JP",
+    "korean": "ko-KR",
+    "chinese": "zh-CN",
+    "german": "de-DE",
+    "french": "fr-FR",
+    "spanish": "es-ES",
+    "mexican": "es-MX",
+    "italian": "it-IT",
+    "portuguese": "pt-PT",
+    "brazilian": "pt-BR",
+    "russian": "ru-RU",
+    "arabic": "ar-SA",
+    "turkish": "tr-TR",
+    "dutch": "nl-NL",
+    "british": "en-GB",
+    "american": "en-US",
+    "australian": "en-AU",
+    "gen z": "en-US",
+    "corporate": "en-GB"
+}
+
+try:
+    import pyttsx3
+except ImportError:
+    pyttsx3 = None
+
+def tts_lang_code(target_culture):
+    return TTS_LANG_MAP.get(target_culture.strip().lower(), "en-US")
+
+def tts_available():
+    return TTS_BACKEND == "pyttsx3" and pyttsx3 is not None
+
+def tts_cache_key(text, lang_code):
+    return hashlib.sha256(f"{TTS_BACKEND}\0{lang_code}\0{text}".encode("utf-8")).hexdigest()
+
+def read_tts_cache(key):
+    for ext, mime in TTS_AUDIO_FORMATS.items():
+        path = os.path.join(TTS_CACHE_DIR, f"{key}.{ext}")
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path, None)  # bump recency for LRU eviction
+            return data, mime
+        except FileNotFoundError:
+            continue
+    return None, None
+
+def evict_tts_cache():
+    entries = []
+    for name in os.listdir(TTS_CACHE_DIR):
+        if name.rsplit(".", 1)[-1] not in TTS_AUDIO_FORMATS:
+            continue
+        path = os.path.join(TTS_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    limit = TTS_CACHE_MAX_MB * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def render_tts_wav(text, lang_code, out_path):
+    engine = pyttsx3.init()
+    lang_prefix = lang_code.split("-")[0].lower()
+    for voice in engine.getProperty("voices"):
+        languages = [l.decode("utf-8", "ignore") if isinstance(l, bytes) else str(l) for l in (voice.languages or [])]
+        if any(lang_prefix in l.lower() for l in languages) or f"/{lang_prefix}" in voice.id.lower():
+            engine.setProperty("voice", voice.id)
+            break
+    engine.save_to_file(text, out_path)
+    engine.runAndWait()
+    engine.stop()
+
+def get_tts_audio(text, lang_code):
+    # Cache read only; rendering happens on the background worker
+    if not tts_available():
+        return None, None
+    return read_tts_cache(tts_cache_key(text, lang_code))
+
+def render_tts_clip(text, lang_code, key):
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=TTS_CACHE_DIR) as tmp:
+        src = os.path.join(tmp, "speech.wav")
+        render_tts_wav(text, lang_code, src)
+        ext = "wav"
+        if shutil.which("ffmpeg"):
+            ogg_path = os.path.join(tmp, "speech.ogg")
+            subprocess.run(
+                ["ffmpeg", "-y", "-loglevel", "error", "-i", src, "-c:a", "libopus", "-b:a", "32k", ogg_path],
+                check=True,
+                timeout=60
+            )
+            src, ext = ogg_path, "ogg"
+        os.replace(src, os.path.join(TTS_CACHE_DIR, f"{key}.{ext}"))
+    evict_tts_cache()
+
+class TTSRenderQueue:
+    # One worker thread renders clips in the background, so translations never
+    # wait on pyttsx3/ffmpeg and the single native engine is never used concurrently.
+    def __init__(self, max_pending):
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.pending = set()
+        threading.Thread(target=self.run, name="tts-render", daemon=True).start()
+
+    def submit(self, text, lang_code):
+        key = tts_cache_key(text, lang_code)
+        with self.lock:
+            if key in self.pending:
+                return
+            try:
+                self.jobs.put_nowait((key, text, lang_code))
+            except queue.Full:
+                return
+            self.pending.add(key)
+
+    def is_pending(self, key):
+        with self.lock:
+            return key in self.pending
+
+    def run(self):
+        while True:
+            key, text, lang_code = self.jobs.get()
+            try:
+                data, _ = read_tts_cache(key)
+                if not data:
+                    render_tts_clip(text, lang_code, key)
+            except Exception:
+                logger.exception("TTS render failed for %s (%s)", key[:12], lang_code)
+            finally:
+                with self.lock:
+                    self.pending.discard(key)
+
+@st.cache_resource
+def get_tts_render_queue():
+    return TTSRenderQueue(TTS_QUEUE_MAX)
+
+def browser_speak_html(text, lang_code):
+    return f"""
+    <script>
+    function speakText(text, lang) {{
+        const utterance = new SpeechSynthesisUtterance(text);
+        utterance.lang = lang;
+        utterance.rate = 1.0;
+        utterance.pitch = 1.0;
+        const voices = window.speechSynthesis.getVoices();
+        const voice = voices.find(v => v.lang === lang) || voices.find(v => v.lang.startsWith(lang.split('-')[0]));
+        if (voice) utterance.voice = voice;
+        speechSynthesis.speak(utterance);
+    }}
+    </script>
+    <button style="background-color:#fff; border:none; border-radius:8px; padding:8px 12px; margin-top:10px; cursor:pointer; font-size:16px;">
+        🔊 Click to Listen
+    </button>
+    <script>
+    const button = document.currentScript.previousElementSibling;
+    button.addEventListener('click', () => {{
+        speakText({json.dumps(text)}, {json.dumps(lang_code)});
+    }});
+    </script>
+    """
+
+@st.fragment(run_every=TTS_POLL_INTERVAL_SECONDS)
+def wait_for_tts_clip(key):
+    # Re-runs on its own until the background render lands, then redraws the page with st.audio
+    poll = session_get("tts_poll")
+    if not poll or poll[0] != key:
+        poll = (key, time.time())
+        session_put("tts_poll", poll)
+
+    data, _ = read_tts_cache(key)
+    if data:
+        st.rerun()
+    if not get_tts_render_queue().is_pending(key) or time.time() - poll[1] > TTS_POLL_MAX_SECONDS:
+        # Render failed, was dropped, or is taking too long: stay on the browser voice
+        session_put("tts_gave_up", key)
+        st.rerun()
+    st.caption("⏳ Preparing audio...")
+
+def render_listen_button(text, target_culture):
+    lang_code = tts_lang_code(target_culture)
+    audio, mime = get_tts_audio(text, lang_code)
+    if audio:
+        st.caption("🔊 Listen")
+        st.audio(audio, format=mime)
+        return
+    key = tts_cache_key(text, lang_code)
+    if tts_available() and session_get("tts_gave_up") != key:
+        get_tts_render_queue().submit(text, lang_code)
+        wait_for_tts_clip(key)
+    # Markup depends only on the text, so reruns of this translation keep its iframe mounted
+    components.html(browser_speak_html(text, lang_code), height=60)
+
+# -------------------- SESSION STATE --------------------
+# st.session_state only keeps small flags (user_email). Anything heavier lives in a
+# process-wide SessionStore that accounts bytes per session, caps each session,
+# and drops sessions that have been idle for SESSION_IDLE_EVICT_SECONDS.
+SESSION_IDLE_EVICT_SECONDS = int(st.secrets.get("SESSION_IDLE_EVICT_SECONDS", 900))
+SESSION_MAX_BYTES = int(st.secrets.get("SESSION_MAX_BYTES", 256 * 1024))
+SESSION_SWEEP_INTERVAL_SECONDS = 60
+HISTORY_PAGE_TTL_SECONDS = int(st.secrets.get("HISTORY_PAGE_TTL_SECONDS", 60))
+OPERATOR_EMAILS = {e.strip().lower() for e in str(st.secrets.get("OPERATOR_EMAILS", "")).split(",") if e.strip()}
+
+class TranslationRecord:
+    __slots__ = ("original", "target", "translated", "model")
+
+    def __init__(self, original, target, translated, model):
+        self.original = original
+        self.target = target
+        self.translated = translated
+        self.model = model
+
+    def as_dict(self):
+        return {"original": self.original, "target": self.target, "translated": self.translated, "model": self.model}
+
+class HistoryEntry:
+    __slots__ = ("id", "original", "target", "translated", "model", "created_at")
+
+    def __init__(self, id, original, target, translated, model, created_at):
+        self.id = id
+        self.original = original
+        self.target = target
+        self.translated = translated
+        self.model = model
+        self.created_at = created_at
+
+class HistoryPage:
+    __slots__ = ("user_email", "entries", "fetched_at")
+
+    def __init__(self, user_email, entries, fetched_at):
+        self.user_email = user_email
+        self.entries = entries
+        self.fetched_at = fetched_at
+
+class PendingCredentials:
+    __slots__ = ("email", "password", "sent_at")
+
+    def __init__(self, email, password, sent_at):
+        self.email = email
+        self.password = password
+        self.sent_at = sent_at
+
+@st.cache_resource
+def get_session_store():
+    return SessionStore(SESSION_IDLE_EVICT_SECONDS, SESSION_MAX_BYTES, SESSION_SWEEP_INTERVAL_SECONDS)
+
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+def session_get(key, default=None):
+    store = get_session_store()
+    store.sweep()
+    return store.get(current_session_id(), key, default)
+
+def session_put(key, value):
+    get_session_store().put(current_session_id(), key, value)
+
+def session_pop(key):
+    return get_session_store().pop(current_session_id(), key)
+
+def get_history_page(user_email, limit=50):
+    page = session_get("history_page")
+    if page and page.user_email == user_email and time.time() - page.fetched_at < HISTORY_PAGE_TTL_SECONDS:
+        return page.entries
+    entries = tuple(HistoryEntry(*row) for row in get_user_translations_db(user_email, limit))
+    session_put("history_page", HistoryPage(user_email, entries, time.time()))
+    return entries
+
+def logout():
+    st.session_state.pop("user_email", None)
+    get_session_store().clear(current_session_id())
+
+# -------------------- TRENDING WARM CACHE --------------------
+# Viral jokes get sent to the same few cultures over and over. A background
+# thread mines humor_translations for the hottest (input, culture) pairs and keeps
+# their most common translation in memory, so a fresh process serves them
+# without calling OpenRouter.
+WARM_CACHE_MAX_KB = int(st.secrets.get("WARM_CACHE_MAX_KB", 2048))
+WARM_CACHE_REFRESH_SECONDS = int(st.secrets.get("WARM_CACHE_REFRESH_SECONDS", 900))
+WARM_CACHE_LOOKBACK_DAYS = int(st.secrets.get("WARM_CACHE_LOOKBACK_DAYS", 30))
+WARM_CACHE_MIN_USERS = int(st.secrets.get("WARM_CACHE_MIN_USERS", 3))
+WARM_CACHE_MAX_PAIRS = int(st.secrets.get("WARM_CACHE_MAX_PAIRS", 5000))
+# The refresh scans the whole lookback window, far past the 5s per-request DB_STATEMENT_TIMEOUT_MS
+WARM_CACHE_STATEMENT_TIMEOUT_MS = int(st.secrets.get("WARM_CACHE_STATEMENT_TIMEOUT_MS", 120000))
+TRENDING_CACHE_MODEL = "trending-cache"  # model_used tag for history rows served from this cache
+
+def normalize_joke_key(input_text, target_culture):
+    # Must match the normalization in the trending_translations statement
+    return " ".join(input_text.split()).lower(), target_culture.strip().lower()
+
+class TrendingCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = {}  # (norm_input, norm_culture) -> (translated_text, model_used)
+        self.bytes = 0
+        self.loaded_at = None
+        self.last_error = None
+        self.rejected = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, input_text, target_culture):
+        key = normalize_joke_key(input_text, target_culture)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def refresh(self):
+        try:
+            with db_cursor() as cur:
+                # Only for this transaction; the pooled connection keeps the normal limit afterwards
+                cur.execute(f"SET LOCAL statement_timeout = {WARM_CACHE_STATEMENT_TIMEOUT_MS}")
+                run_query(cur, "trending_translations", (
+                    list(TTS_LANG_MAP), WARM_CACHE_LOOKBACK_DAYS, WARM_CACHE_MIN_USERS, WARM_CACHE_MAX_PAIRS,
+                    TRENDING_CACHE_MODEL
+                ))
+                rows = cur.fetchall()
+        except Exception as e:
+            logger.exception("Trending cache refresh failed; keeping %d cached pairs", len(self.entries))
+            with self.lock:
+                self.last_error = str(e)
+            return
+
+        # Rows arrive hottest first; stop once the memory cap is reached.
+        # Older rows predate clean_translation, so run them through it and skip junk.
+        entries, total, rejected = {}, 0, 0
+        for norm_input, norm_culture, original_text, target_culture, translated_text, model_used, _users in rows:
+            cleaned, _reason = clean_translation(translated_text, build_prompt(original_text, target_culture), original_text)
+            if not cleaned:
+                rejected += 1
+                continue
+            key = (norm_input, norm_culture)
+            value = (cleaned, model_used)
+            size = approx_size(key) + approx_size(value)
+            if total + size > self.max_bytes:
+                break
+            entries[key] = value
+            total += size
+
+        with self.lock:
+            self.entries = entries
+            self.bytes = total
+            self.rejected = rejected
+            self.loaded_at = datetime.now(timezone.utc)
+            self.last_error = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "pairs": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected_on_load": self.rejected,
+                "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+                "last_error": self.last_error
+            }
+
+def run_trending_warmer(cache):
+    while True:
+        time.sleep(WARM_CACHE_REFRESH_SECONDS)
+        cache.refresh()
+
+@st.cache_resource
+def get_trending_cache():
+    cache = TrendingCache(WARM_CACHE_MAX_KB * 1024)
+    cache.refresh()  # warm before the first session translates anything
+    # No ScriptRunContext on purpose: the warmer must not hold on to (or draw into) any user's session
+    threading.Thread(target=run_trending_warmer, args=(cache,), name="trending-warmer", daemon=True).start()
+    return cache
+
+get_trending_cache()
+
+def translate_with_warm_cache(input_text, target_culture, max_attempts=3):
+    hit = get_trending_cache().lookup(input_text, target_culture)
+    if hit:
+        translated_text, model_used = hit
+        # Tagged so the saved history row is excluded from the next trending refresh
+        return translated_text, TRENDING_CACHE_MODEL, [f"Served from trending cache (originally {model_used})"]
+    return smart_translate_humor(input_text, target_culture, max_attempts)
+
 # -------------------- PAGE LAYOUT / NAV --------------------
 st.sidebar.title("🌍 Navigation")
 page = st.sidebar.radio("Go to", ["Welcome", "Main Translator", "Translation History", "Settings & Profile"])
@@ -615,35 +1194,28 @@ elif page == "Main Translator":
                         ok, err = create_and_send_otp(su_email, purpose="signup")
                         if ok:
                             st.success("OTP sent to your email. Check your inbox (and spam).")
-                            st.session_state["pending_signup_email"] = su_email
-                            st.session_state["pending_signup_password"] = su_password
-                            st.session_state["signup_sent_at"] = time.time()
+                            session_put("pending_signup", PendingCredentials(su_email, su_password, time.time()))
                         else:
                             st.error(f"Failed to send OTP: {err}")
 
-            if st.session_state.get("pending_signup_email") == su_email:
+            pending_signup = session_get("pending_signup")
+            if pending_signup and pending_signup.email == su_email:
                 otp_val = st.text_input("Enter OTP", key="signup_otp")
                 if st.button("Verify & Create Account", key="verify_signup_otp"):
-                    ok, err = verify_otp(su_email, otp_val, purpose="signup")
-                    if ok:
-                        # create user
-                        pw = st.session_state.get("pending_signup_password", "")
-                        if not pw:
-                            st.error("Password not found in session. Please sign up again.")
-                        else:
-                            success, e = create_user(su_email, pw)
-                            
-                            if success:
-                                st.success("Account created! You are now logged in.")
-                                st.session_state["user_email"] = su_email
-                                # cleanup
-                                st.session_state.pop("pending_signup_email", None)
-                                st.session_state.pop("pending_signup_password", None)
-                                st.rerun()
-                            else:
-                                st.error(f"Failed to create user: {e}")
+                    pw = pending_signup.password
+                    if not pw:
+                        st.error("Password not found in session. Please sign up again.")
                     else:
-                        st.error(f"OTP verify failed: {err}")
+                        # verifies the OTP and creates the user in one transaction
+                        success, err = create_user(su_email, pw, otp_val)
+                        if success:
+                            st.success("Account created! You are now logged in.")
+                            st.session_state["user_email"] = su_email
+                            # cleanup
+                            session_pop("pending_signup")
+                            st.rerun()
+                        else:
+                            st.error(f"Failed to create user: {err}")
 
         with tab_reset:
             rs_email = st.text_input("Email (to reset)", key="reset_email")
@@ -655,23 +1227,22 @@ elif page == "Main Translator":
                     ok, err = create_and_send_otp(rs_email, purpose="reset")
                     if ok:
                         st.success("OTP sent for password reset.")
-                        st.session_state["pending_reset_email"] = rs_email
-                        st.session_state["reset_sent_at"] = time.time()
+                        session_put("pending_reset", PendingCredentials(rs_email, None, time.time()))
                     else:
                         st.error(f"Failed to send OTP: {err}")
 
-            if st.session_state.get("pending_reset_email") == rs_email:
+            pending_reset = session_get("pending_reset")
+            if pending_reset and pending_reset.email == rs_email:
                 otp_val = st.text_input("Enter Reset OTP", key="reset_otp")
                 new_pw = st.text_input("New password", type="password", key="reset_new_pw")
                 if st.button("Verify & Update Password", key="verify_reset_otp"):
-                    ok, err = verify_otp(rs_email, otp_val, purpose="reset")
+                    ok, err = update_user_password(rs_email, new_pw, otp_val)
                     if ok:
-                        update_user_password(rs_email, new_pw)
                         st.success("Password updated. You may now log in.")
-                        st.session_state.pop("pending_reset_email", None)
+                        session_pop("pending_reset")
                         st.rerun()
                     else:
-                        st.error(f"OTP verify failed: {err}")
+                        st.error(f"Password reset failed: {err}")
 
     else:
         # Logged in UI
@@ -679,7 +1250,7 @@ elif page == "Main Translator":
         col1, col2 = st.columns([1, 1])
         with col1:
             if st.button("Logout", use_container_width=True):
-                st.session_state.pop("user_email", None)
+                logout()
                 st.rerun()
         with col2:
             if st.button("View History", use_container_width=True):
@@ -699,73 +1270,36 @@ elif page == "Main Translator":
                 st.warning("Please fill in both fields.")
             else:
                 with st.spinner("Finding the best AI model for your humor... 🤖💬"):
-                    translated_text, model_used, attempts = smart_translate_humor(input_text, target_culture, max_attempts)
-                    if translated_text:
-                        st.success("✅ Culturally adapted humor:")
-                        st.markdown(f"### {translated_text}")
-
-                        # Text-to-speech button
-                        lang_map = {
-                            "indian": "hi-IN",
-                            "japanese": "ja-JP",
-                            "german": "de-DE",
-                            "french": "fr-FR",
-                            "chinese": "zh-CN",
-                            "gen z": "en-US",
-                            "corporate": "en-GB"
-                        }
-                        lang_code = lang_map.get(target_culture.strip().lower(), "en-US")
-
-                        speak_button = f"""
-                        <script>
-                        function speakText(text, lang) {{
-                            const utterance = new SpeechSynthesisUtterance(text);
-                            utterance.lang = lang;
-                            utterance.rate = 1.0;
-                            utterance.pitch = 1.0;
-                            const voices = window.speechSynthesis.getVoices();
-                            const voice = voices.find(v => v.lang === lang) || voices.find(v => v.lang.startsWith(lang.split('-')[0]));
-                            if (voice) utterance.voice = voice;
-                            speechSynthesis.speak(utterance);
-                        }}
-                        </script>
-                        <button style="background-color:#fff; border:none; border-radius:8px; padding:8px 12px; margin-top:10px; cursor:pointer; font-size:16px;">
-                            🔊 Click to Listen
-                        </button>
-                        <script>
-                        const button = document.currentScript.previousElementSibling;
-                        button.addEventListener('click', () => {{
-                            speakText({json.dumps(translated_text)}, {json.dumps(lang_code)});
-                        }});
-                        </script>
-                        """
-                        components.html(speak_button, height=60)
-
-                        if save_translation and model_used:
-                            save_translation_db(st.session_state["user_email"], input_text, target_culture, translated_text, model_used)
-                            st.success("Saved to your history!")
-
-                        # debug store
-                        st.session_state.last_translation = {
-                            "original": input_text,
-                            "target": target_culture,
-                            "translated": translated_text,
-                            "model": model_used
-                        }
-                    else:
-                        st.error("😵 All AI models failed! Here's what happened:")
-                        st.write("### Attempt History:")
-                        for attempt in attempts:
-                            st.write(f"- {attempt}")
-                        st.info(
-                                 """
-                                 **💡 What to do now:**
-                                 - Wait 2 minutes and try again
-                                 - Try a shorter or simpler joke
-                                 - Reduce the number of models to try
-                                 - Free AI models often get busy during peak times
-                                 """
-                                )
+                    translated_text, model_used, attempts = translate_with_warm_cache(input_text, target_culture, max_attempts)
+                if translated_text:
+                    if save_translation and model_used:
+                        save_translation_db(st.session_state["user_email"], input_text, target_culture, translated_text, model_used)
+                        session_pop("history_page")
+                        st.success("Saved to your history!")
+
+                    session_put("last_translation", TranslationRecord(input_text, target_culture, translated_text, model_used))
+                else:
+                    session_pop("last_translation")
+                    st.error("😵 All AI models failed! Here's what happened:")
+                    st.write("### Attempt History:")
+                    for attempt in attempts:
+                        st.write(f"- {attempt}")
+                    st.info(
+                             """
+                             **💡 What to do now:**
+                             - Wait 2 minutes and try again
+                             - Try a shorter or simpler joke
+                             - Reduce the number of models to try
+                             - Free AI models often get busy during peak times
+                             """
+                            )
+
+        # Drawn on every rerun (not just the click) so the audio player shows up once the clip is rendered
+        last_translation = session_get("last_translation")
+        if last_translation:
+            st.success("✅ Culturally adapted humor:")
+            st.markdown(f"### {last_translation.translated}")
+            render_listen_button(last_translation.translated, last_translation.target)
 
         if show_debug:
             st.divider()
@@ -773,22 +1307,22 @@ elif page == "Main Translator":
             for i, model in enumerate(FREE_MODELS[:5]):
                 st.write(f"{i+1}. {model}")
             st.caption(f"... and {len(FREE_MODELS) - 5} more backup models")
-            if 'last_translation' in st.session_state:
+            last_translation = session_get("last_translation")
+            if last_translation:
                 st.write("**Last translation:**")
-                st.json(st.session_state.last_translation)
+                st.json(last_translation.as_dict())
 
 # -------------------- TRANSLATION HISTORY --------------------
 elif page == "Translation History":
     st.subheader("📜 Your Translation History")
     if "user_email" in st.session_state:
-        rows = get_user_translations_db(st.session_state["user_email"])
-        if rows:
-            for i, row in enumerate(rows):
-                _id, original_text, target_culture, translated_text, model_used, created_at = row
-                with st.expander(f"Translation {i+1} - {target_culture}"):
-                    st.write(f"**Original:** {original_text}")
-                    st.write(f"**Translated:** {translated_text}")
-                    st.caption(f"Model: {model_used} | Created: {created_at}")
+        entries = get_history_page(st.session_state["user_email"])
+        if entries:
+            for i, entry in enumerate(entries):
+                with st.expander(f"Translation {i+1} - {entry.target}"):
+                    st.write(f"**Original:** {entry.original}")
+                    st.write(f"**Translated:** {entry.translated}")
+                    st.caption(f"Model: {entry.model} | Created: {entry.created_at}")
         else:
             st.info("No translations found yet. Try translating some jokes!")
     else:
@@ -800,8 +1334,29 @@ elif page == "Settings & Profile":
     if "user_email" in st.session_state:
         st.success(f"Logged in as {st.session_state['user_email']}")
         if st.button("Logout", use_container_width=True):
-            st.session_state.pop("user_email", None)
+            logout()
             st.experimental_rerun()
+
+        if st.session_state["user_email"].strip().lower() in OPERATOR_EMAILS:
+            st.divider()
+            st.subheader("🛠️ Operator: Session Memory")
+            report = get_session_store().report()
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Active sessions", report["sessions"])
+            col2.metric("Session memory", f"{report['total_bytes'] / 1024:.1f} KB")
+            col3.metric("Evicted idle sessions", report["evicted_idle_sessions"])
+            st.caption(f"Per-session cap: {SESSION_MAX_BYTES / 1024:.0f} KB | Idle eviction after {SESSION_IDLE_EVICT_SECONDS}s")
+            if report["largest_sessions"]:
+                st.write("**Largest sessions:**")
+                st.json(report["largest_sessions"])
+
+            st.subheader("🛠️ Operator: Process Metrics")
+            st.write("**DB query timings:**")
+            st.json(get_query_stats().snapshot())
+            st.write("**User cache:**")
+            st.json(get_user_cache().metrics())
+            st.write("**Trending cache:**")
+            st.json(get_trending_cache().stats())
     else:
         st.warning("Please log in to view your profile settings. Go to Main Translator to sign in or sign up.")
 
@@ -0,0 +1,168 @@
+# caching.py
+# Process-wide in-memory stores used by app.py (user rows, per-session state).
+# Kept free of Streamlit so they can be imported and tested on their own.
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+MISSING = object()
+
+def approx_size(obj):
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool, type(None), datetime)):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(approx_size(k) + approx_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(approx_size(v) for v in obj)
+    return size + sum(approx_size(getattr(obj, name, None)) for name in getattr(type(obj), "__slots__", ()))
+
+class UserCache:
+    # Process-wide email -> users row cache. Unknown emails are cached as None
+    # for a shorter TTL so repeated lookups of bogus addresses stay off the DB.
+    # Each invalidation stamps the email with a new generation; a reader records
+    # the generation before querying and its put() is dropped if a write landed
+    # in between, so a stale row can never be cached after an invalidation.
+    def __init__(self, ttl, negative_ttl, max_entries):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # email -> (expires_at, row or None)
+        self.generations = OrderedDict()  # email -> generation of its last invalidation
+        self.generation = 0
+        self.generation_floor = 0  # highest generation forgotten when trimming
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, email):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(email)
+            if entry is None or entry[0] < now:
+                self.entries.pop(email, None)
+                self.misses += 1
+                return MISSING
+            self.entries.move_to_end(email)
+            if entry[1] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry[1]
+
+    def version(self, email):
+        with self.lock:
+            return self.generations.get(email, self.generation_floor)
+
+    def put(self, email, row, version):
+        ttl = self.ttl if row is not None else self.negative_ttl
+        with self.lock:
+            if self.generations.get(email, self.generation_floor) != version:
+                return  # invalidated while the caller was reading
+            self.entries[email] = (time.monotonic() + ttl, row)
+            self.entries.move_to_end(email)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, email):
+        with self.lock:
+            self.entries.pop(email, None)
+            self.generation += 1
+            self.generations[email] = self.generation
+            self.generations.move_to_end(email)
+            while len(self.generations) > self.max_entries:
+                _, forgotten = self.generations.popitem(last=False)
+                self.generation_floor = max(self.generation_floor, forgotten)
+
+    def metrics(self):
+        with self.lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.negative_hits) / lookups, 3) if lookups else 0.0
+            }
+
+class SessionStore:
+    def __init__(self, idle_seconds, max_bytes, sweep_interval=60):
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.lock = threading.Lock()
+        self.sessions = {}  # session id -> {"last_seen": float, "bytes": int, "items": OrderedDict(key -> (value, size))}
+        self.last_sweep = time.monotonic()
+        self.evicted_sessions = 0
+
+    def _session(self, sid):
+        session = self.sessions.get(sid)
+        if session is None:
+            session = self.sessions[sid] = {"last_seen": 0.0, "bytes": 0, "items": OrderedDict()}
+        session["last_seen"] = time.monotonic()
+        return session
+
+    def get(self, sid, key, default=None):
+        with self.lock:
+            item = self._session(sid)["items"].get(key)
+            return item[0] if item else default
+
+    def put(self, sid, key, value):
+        size = approx_size(value)
+        with self.lock:
+            session = self._session(sid)
+            items = session["items"]
+            if key in items:
+                session["bytes"] -= items.pop(key)[1]
+            items[key] = (value, size)
+            session["bytes"] += size
+            # Over budget: drop this session's least recently written items first
+            while session["bytes"] > self.max_bytes and len(items) > 1:
+                _, (_, dropped) = items.popitem(last=False)
+                session["bytes"] -= dropped
+
+    def pop(self, sid, key):
+        with self.lock:
+            session = self._session(sid)
+            item = session["items"].pop(key, None)
+            if item:
+                session["bytes"] -= item[1]
+                return item[0]
+            return None
+
+    def clear(self, sid):
+        with self.lock:
+            self.sessions.pop(sid, None)
+
+    def sweep(self):
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_sweep < self.sweep_interval:
+                return
+            self.last_sweep = now
+            idle = [sid for sid, session in self.sessions.items() if now - session["last_seen"] > self.idle_seconds]
+            for sid in idle:
+                del self.sessions[sid]
+            self.evicted_sessions += len(idle)
+
+    def report(self):
+        now = time.monotonic()
+        with self.lock:
+            largest = sorted(self.sessions.items(), key=lambda kv: kv[1]["bytes"], reverse=True)[:10]
+            return {
+                "sessions": len(self.sessions),
+                "total_bytes": sum(session["bytes"] for session in self.sessions.values()),
+                "evicted_idle_sessions": self.evicted_sessions,
+                "largest_sessions": [
+                    {
+                        "session": sid[:8],
+                        "bytes": session["bytes"],
+                        "idle_s": round(now - session["last_seen"]),
+                        "keys": list(session["items"])
+                    }
+                    for sid, session in largest
+                ]
+            }
@@ -0,0 +1,466 @@
+# loadtest.py
+# Simulates many concurrent Streamlit sessions running app.py end to end
+# (signup -> login -> translate -> history).
+#
+# A real `streamlit run app.py` server is started and every virtual user talks
+# to it over Streamlit's browser websocket protocol, like a headless browser tab.
+# All sessions therefore share one app process: one DB pool, one set of
+# st.cache_resource caches, one SMTP/OpenRouter client path, exactly as in
+# production. Sessions are asyncio tasks, so hundreds fit in this process.
+#
+# OpenRouter and SMTP are replaced by local stand-in servers started here.
+# Postgres is NOT stubbed: point --pg-* at a real local/throwaway instance
+# (it gets test users written to it).
+#
+# Connection budget: the app opens at most --db-pool-maxconn Postgres
+# connections (DB_POOL_MAXCONN, default 20) however many sessions run, plus
+# one for the trending-cache refresh when it overlaps. Keep that below the
+# server's max_connections (100 by default); excess sessions queue on the app's
+# pool, which is what the saturation curve is meant to show.
+#
+# The client speaks the protocol of Streamlit 1.66 (radio values are sent as
+# strings); older servers may need int_value for radios.
+#
+#   python loadtest.py --levels 10,25,50,100,200 --pg-user postgres --pg-password postgres
+#
+import argparse
+import asyncio
+import base64
+import csv
+import http.server
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+from websockets.asyncio.client import connect
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+STEPS = ["welcome", "signup_send_otp", "signup_verify", "login", "translate", "history"]
+
+SAMPLE_JOKES = [
+    "Why did the scarecrow win an award? Because he was outstanding in his field.",
+    "I told my boss I needed a raise because three companies were after me. The electric, gas and water.",
+    "My code doesn't work and I have no idea why. My code works and I have no idea why.",
+    "I'm on a seafood diet. I see food and I eat it."
+]
+SAMPLE_CULTURES = ["Japanese", "Indian", "Gen Z", "Corporate", "German", "French"]
+
+# -------------------- OPENROUTER STAND-IN --------------------
+class FakeOpenRouterHandler(http.server.BaseHTTPRequestHandler):
+    latency = (0.2, 1.0)
+    error_rate = 0.0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(random.uniform(*self.latency))
+
+        if random.random() < self.error_rate:
+            self.send_response(random.choice([429, 503]))
+            self.end_headers()
+            return
+
+        content = (
+            f"Here is a version for a local crowd ({body.get('model', 'model')}): "
+            "the punchline lands on the same surprise, just with familiar everyday details."
+        )
+        payload = json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+# -------------------- SMTP STAND-IN --------------------
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, latency):
+        super().__init__(address, FakeSMTPHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.mailbox = {}  # recipient -> latest OTP
+
+    def pop_otp(self, email):
+        with self.lock:
+            return self.mailbox.pop(email, None)
+
+async def wait_for_otp(smtp, email, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        otp = smtp.pop_otp(email)
+        if otp:
+            return otp
+        await asyncio.sleep(0.05)
+    return None
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        self.reply("220 fake-smtp ready")
+        recipient = None
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode("utf-8", "ignore").strip()
+            verb = line.split(" ", 1)[0].upper()
+
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-fake-smtp")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif verb == "AUTH":
+                if len(line.split()) == 2:
+                    self.reply("334 ")
+                    self.rfile.readline()
+                self.reply("235 Authentication successful")
+            elif verb == "RCPT":
+                match = re.search(r"<([^>]+)>", line)
+                recipient = match.group(1) if match else None
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data_line.decode("utf-8", "ignore"))
+                time.sleep(random.uniform(*self.server.latency))
+                self.store(recipient, "".join(lines))
+                self.reply("250 OK queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+    def store(self, recipient, message):
+        if "Content-Transfer-Encoding: base64" in message:
+            encoded = message.split("\n\n", 1)[-1].replace("\r", "").replace("\n", "")
+            try:
+                message += base64.b64decode(encoded).decode("utf-8", "ignore")
+            except ValueError:
+                pass
+        match = re.search(r"is: (\d+)", message)
+        if recipient and match:
+            with self.server.lock:
+                self.server.mailbox[recipient] = match.group(1)
+
+# -------------------- APP SERVER --------------------
+def start_app_server(workdir, secrets, port, timeout=60.0):
+    # st.secrets is read from .streamlit/secrets.toml under the working directory
+    os.makedirs(os.path.join(workdir, ".streamlit"))
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as f:
+        for key, value in secrets.items():
+            f.write(f"{key} = {json.dumps(value)}\n")
+    server = subprocess.Popen([
+        sys.executable, "-m", "streamlit", "run", APP_PATH,
+        "--server.headless", "true",
+        "--server.address", "127.0.0.1",
+        "--server.port", str(port),
+        "--server.enableXsrfProtection", "false",
+        "--server.fileWatcherType", "none",
+        "--browser.gatherUsageStats", "false"
+    ], cwd=workdir)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit server exited with code {server.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2) as resp:
+                if resp.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("streamlit server did not become healthy")
+
+# -------------------- HEADLESS CLIENT --------------------
+class StepFailed(Exception):
+    pass
+
+class StreamlitSession:
+    # One browser tab: keeps widget state like the frontend does and sends a
+    # rerun_script BackMsg for every interaction.
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.ws = None
+        self.elements = []  # (element type, proto) drawn by the last full run
+        self.widgets = {}  # widget id -> WidgetState sent on every rerun
+
+    async def __aenter__(self):
+        self.ws = await connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.ws.close()
+
+    async def rerun(self, trigger_id=None):
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.widget_states.widgets.extend(self.widgets.values())
+        if trigger_id:
+            msg.rerun_script.widget_states.widgets.append(WidgetState(id=trigger_id, trigger_value=True))
+        await self.ws.send(msg.SerializeToString())
+        await asyncio.wait_for(self.wait_for_run(), self.timeout)
+        return self
+
+    async def wait_for_run(self):
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await self.ws.recv())
+            kind = fwd.WhichOneof("type")
+            if kind == "new_session":
+                self.elements = []
+            elif kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                element_type = element.WhichOneof("type")
+                self.elements.append((element_type, getattr(element, element_type)))
+            elif kind == "script_finished":
+                # st.rerun() ends a run early and the server starts the next one itself
+                if fwd.script_finished in (ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_WITH_COMPILE_ERROR):
+                    return
+
+    def widget(self, element_type, label):
+        for kind, proto in reversed(self.elements):
+            if kind == element_type and proto.label == label:
+                return proto
+        raise StepFailed(f"no {element_type} labelled {label!r} on the page")
+
+    def set_text(self, label, value, element_type="text_input"):
+        widget_id = self.widget(element_type, label).id
+        self.widgets[widget_id] = WidgetState(id=widget_id, string_value=value)
+
+    async def choose(self, label, option):
+        widget_id = self.widget("radio", label).id
+        self.widgets[widget_id] = WidgetState(id=widget_id, string_value=option)
+        return await self.rerun()
+
+    async def click(self, label):
+        return await self.rerun(self.widget("button", label).id)
+
+    def errors(self):
+        found = [proto.message for kind, proto in self.elements if kind == "exception"]
+        found += [proto.body for kind, proto in self.elements if kind == "alert" and proto.format == proto.ERROR]
+        return found
+
+# -------------------- VIRTUAL USER --------------------
+async def timed(results, step, session, action):
+    start = time.perf_counter()
+    await action
+    results.append((step, time.perf_counter() - start))
+    errors = session.errors()
+    if errors:
+        raise StepFailed(f"{step}: {errors[0]}")
+
+async def run_virtual_user(url, smtp, email, timeout):
+    results = []
+    password = "loadtest-" + uuid.uuid4().hex[:12]
+    try:
+        # Signup in one browser tab
+        async with StreamlitSession(url, timeout) as s:
+            await timed(results, "welcome", s, s.rerun())
+            await s.choose("Go to", "Main Translator")
+            s.set_text("Email (for signup)", email)
+            s.set_text("Choose password", password)
+            await timed(results, "signup_send_otp", s, s.click("Send Signup OTP"))
+
+            otp = await wait_for_otp(smtp, email)
+            if not otp:
+                raise StepFailed("signup_send_otp: no OTP delivered")
+            s.set_text("Enter OTP", otp)
+            await timed(results, "signup_verify", s, s.click("Verify & Create Account"))
+
+        # Login from a fresh tab, then translate and browse history
+        async with StreamlitSession(url, timeout) as s:
+            await s.rerun()
+            await s.choose("Go to", "Main Translator")
+            s.set_text("Email", email)
+            s.set_text("Password", password)
+            await timed(results, "login", s, s.click("Login"))
+
+            s.set_text("Enter a joke or funny phrase:", random.choice(SAMPLE_JOKES), element_type="text_area")
+            s.set_text("Target culture:", random.choice(SAMPLE_CULTURES))
+            await timed(results, "translate", s, s.click("Translate Humor 🎉"))
+
+            await timed(results, "history", s, s.choose("Go to", "Translation History"))
+        return True, results, None
+    except asyncio.TimeoutError:
+        step = STEPS[len(results)] if len(results) < len(STEPS) else "unknown"
+        return False, results, f"{step}: timed out"
+    except Exception as e:
+        return False, results, str(e)[:200]
+
+# -------------------- REPORTING --------------------
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+async def run_level(concurrency, sessions, url, smtp, timeout, run_id):
+    emails = [f"load-{run_id}-c{concurrency}-{i}@example.test" for i in range(sessions)]
+    gate = asyncio.Semaphore(concurrency)
+
+    async def bounded(email):
+        async with gate:
+            return await run_virtual_user(url, smtp, email, timeout)
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(bounded(email) for email in emails))
+    elapsed = time.perf_counter() - start
+
+    latencies = {step: [] for step in STEPS}
+    errors = {}
+    for ok, results, err in outcomes:
+        for step, seconds in results:
+            latencies[step].append(seconds)
+        if not ok:
+            key = err.split(":", 1)[0] if err.split(":", 1)[0] in STEPS else err
+            errors[key] = errors.get(key, 0) + 1
+
+    failed = sum(1 for ok, _, _ in outcomes if not ok)
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "elapsed_s": elapsed,
+        "sessions_per_s": sessions / elapsed if elapsed else 0.0,
+        "error_rate": failed / sessions if sessions else 0.0,
+        "errors": errors,
+        "latency": {
+            step: {
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99)
+            }
+            for step, values in latencies.items()
+        }
+    }
+
+def print_level(report):
+    print(
+        f"\n== concurrency {report['concurrency']}: {report['sessions']} sessions in {report['elapsed_s']:.1f}s "
+        f"| {report['sessions_per_s']:.2f} sessions/s | error rate {report['error_rate']:.1%}"
+    )
+    print(f"   {'step':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step in STEPS:
+        lat = report["latency"][step]
+        print(f"   {step:<18}{lat['p50'] * 1000:>10.0f}{lat['p95'] * 1000:>10.0f}{lat['p99'] * 1000:>10.0f}")
+    for step, count in sorted(report["errors"].items()):
+        print(f"   ! {count} session(s) failed at {step}")
+
+def print_saturation_curve(reports):
+    print("\n== Saturation curve")
+    print(f"   {'concurrency':>11}{'sessions/s':>12}{'errors':>9}{'translate p95 ms':>18}")
+    best = max((r["sessions_per_s"] for r in reports), default=0.0) or 1.0
+    for r in reports:
+        bar = "#" * int(30 * r["sessions_per_s"] / best)
+        print(
+            f"   {r['concurrency']:>11}{r['sessions_per_s']:>12.2f}{r['error_rate']:>9.1%}"
+            f"{r['latency']['translate']['p95'] * 1000:>18.0f}  {bar}"
+        )
+
+def write_csv(path, reports):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["concurrency", "sessions", "sessions_per_s", "error_rate"] +
+                        [f"{step}_{p}_ms" for step in STEPS for p in ("p50", "p95", "p99")])
+        for r in reports:
+            writer.writerow([r["concurrency"], r["sessions"], round(r["sessions_per_s"], 3), round(r["error_rate"], 4)] +
+                            [round(r["latency"][step][p] * 1000, 1) for step in STEPS for p in ("p50", "p95", "p99")])
+
+# -------------------- MAIN --------------------
+def parse_range(value):
+    low, _, high = value.partition(",")
+    return float(low), float(high or low)
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the Cross-Culture Humor Mapper.")
+    parser.add_argument("--levels", default="10,25,50,100", help="comma-separated concurrency levels")
+    parser.add_argument("--sessions-per-level", type=int, default=0, help="sessions per level (default: 2x concurrency)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-step timeout in seconds")
+    parser.add_argument("--port", type=int, default=8599, help="port for the streamlit server under test")
+    parser.add_argument("--db-pool-maxconn", type=int, default=20, help="DB_POOL_MAXCONN for the app (its Postgres connection budget)")
+    parser.add_argument("--llm-latency", type=parse_range, default=(0.2, 1.0), help="fake OpenRouter latency range, e.g. 0.2,1.0")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="fraction of fake OpenRouter calls returning 429/503")
+    parser.add_argument("--smtp-latency", type=parse_range, default=(0.1, 0.5), help="fake SMTP delivery latency range")
+    parser.add_argument("--pg-host", default="localhost")
+    parser.add_argument("--pg-port", type=int, default=5432)
+    parser.add_argument("--pg-db", default="humor_loadtest")
+    parser.add_argument("--pg-user", default="postgres")
+    parser.add_argument("--pg-password", default="postgres")
+    parser.add_argument("--csv", help="write the saturation curve to this CSV file")
+    args = parser.parse_args()
+
+    FakeOpenRouterHandler.latency = args.llm_latency
+    FakeOpenRouterHandler.error_rate = args.llm_error_rate
+    llm = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenRouterHandler)
+    llm.daemon_threads = True
+    smtp = FakeSMTPServer(("127.0.0.1", 0), args.smtp_latency)
+    for server in (llm, smtp):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    secrets = {
+        "POSTGRES_HOST": args.pg_host,
+        "POSTGRES_PORT": args.pg_port,
+        "POSTGRES_DB": args.pg_db,
+        "POSTGRES_USER": args.pg_user,
+        "POSTGRES_PASSWORD": args.pg_password,
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": smtp.server_address[1],
+        "SMTP_USER": "loadtest",
+        "SMTP_PASSWORD": "loadtest",
+        "SMTP_STARTTLS": "false",
+        "EMAIL_FROM": "loadtest@example.test",
+        "OPENROUTER_API_KEY": "loadtest",
+        "OPENROUTER_URL": f"http://127.0.0.1:{llm.server_address[1]}/api/v1/chat/completions",
+        "DB_POOL_MAXCONN": args.db_pool_maxconn
+    }
+    workdir = tempfile.mkdtemp(prefix="humor-loadtest-")
+    server = start_app_server(workdir, secrets, args.port)
+    url = f"ws://127.0.0.1:{args.port}/_stcore/stream"
+
+    run_id = uuid.uuid4().hex[:8]
+    reports = []
+    for concurrency in [int(c) for c in args.levels.split(",") if c.strip()]:
+        sessions = args.sessions_per_level or concurrency * 2
+        report = asyncio.run(run_level(concurrency, sessions, url, smtp, args.timeout, run_id))
+        print_level(report)
+        reports.append(report)
+
+    print_saturation_curve(reports)
+    if args.csv:
+        write_csv(args.csv, reports)
+        print(f"\nSaturation curve written to {args.csv}")
+
+    server.terminate()
+    server.wait(timeout=10)
+    shutil.rmtree(workdir, ignore_errors=True)
+    llm.shutdown()
+    smtp.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# postprocess.py
+# Cheap local checks so junk completions count as a model failure instead of
+# reaching the user (who would otherwise just hit Translate again).
+# Kept free of Streamlit so it can be imported and tested on its own.
+import re
+
+MIN_TRANSLATION_CHARS = 10
+# Optional "Sure!" preamble, then a bare label ("Translation -") or a
+# "Here's a version for Japanese culture:" lead-in that ends at its colon.
+LABEL_PREFIX_RE = re.compile(
+    r"^\s*(?:(?:sure|okay|ok|of course|certainly|absolutely)\b[!,.]*\s*)?"
+    r"(?:(?:translated humor|translation|adapted (?:joke|humor|version))\s*[:\-–]"
+    r"|here(?:'s|’s| is) (?:the|a|an|my|your|one) [^:\n]{0,80}?"
+    r"\b(?:translation|version|adaptation|adapted|joke|take|rendition)\b(?:\s*[\-–]|[^:\n]{0,60}:))\s*",
+    re.IGNORECASE
+)
+
+# "I can't ..." on its own is a common joke opener, so a refusal needs an
+# apology, an AI disclaimer, or an object that points back at the request.
+_CANNOT = r"i (?:cannot|can'?t|am unable to|'m unable to|am not able to|won'?t)"
+REFUSAL_RE = re.compile(
+    r"^(?:"
+    r"as an ai\b"
+    r"|(?:i'?m|i am) sorry,? (?:but )?" + _CANNOT + r"\b"
+    r"|" + _CANNOT + r" (?:help|assist)(?: you)? with (?:that|this|your)\b"
+    r"|" + _CANNOT + r" (?:comply|fulfill|complete|do|create|write|provide|translate|adapt)"
+    r" (?:with )?(?:that|this|your)(?: request| task| joke)?\s*(?:[.!]|$)"
+    r"|" + _CANNOT + r" (?:comply|fulfill) (?:with )?(?:that|this|your) request\b"
+    r")",
+    re.IGNORECASE
+)
+
+def strip_markdown(text):
+    text = re.sub(r"```[\w-]*", "", text)
+    text = re.sub(r"^\s{0,3}#{1,6}\s*", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^\s*>\s?", "", text, flags=re.MULTILINE)
+    text = re.sub(r"(\*\*|__)(.+?)\1", r"\2", text)
+    # Single-marker emphasis; word-internal underscores (snake_case) are left alone
+    text = re.sub(r"(?<![\w*])\*(?![\s*])(.+?)(?<![\s*])\*(?![\w*])", r"\1", text)
+    text = re.sub(r"(?<!\w)_(?![\s_])(.+?)(?<![\s_])_(?!\w)", r"\1", text)
+    return text
+
+def strip_prompt_echo(text, prompt, input_text):
+    echoed_prompt = prompt.strip()
+    if echoed_prompt in text:
+        text = text.split(echoed_prompt, 1)[1]
+    text = re.sub(r"^\s*Input:\s*" + re.escape(input_text.strip()) + r"\s*", "", text, flags=re.IGNORECASE)
+    previous = None
+    while previous != text:
+        previous = text
+        text = LABEL_PREFIX_RE.sub("", text).strip().strip('"“”').strip()
+    return text
+
+def normalize_whitespace(text):
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+def comparable(text):
+    return re.sub(r"\W+", " ", text).strip().lower()
+
+def clean_translation(raw_text, prompt, input_text):
+    # Returns (cleaned_text, None) or (None, rejection_reason)
+    # Echo first, while the echoed prompt still matches byte for byte; then
+    # again after markdown so "**Translation:**" style labels come off too.
+    text = strip_prompt_echo(raw_text or "", prompt, input_text)
+    text = strip_markdown(text)
+    plain_prompt, plain_input = strip_markdown(prompt), strip_markdown(input_text)
+    text = strip_prompt_echo(text, plain_prompt, plain_input)
+    text = normalize_whitespace(text)
+
+    if len(text) <= MIN_TRANSLATION_CHARS:
+        return None, "empty response"
+    if REFUSAL_RE.search(text):
+        return None, "refusal"
+    text_key = comparable(text)
+    if text_key in (comparable(input_text), comparable(plain_input)) or text_key in comparable(plain_prompt):
+        return None, "echoed the prompt"
+    return text, None
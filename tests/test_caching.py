@@ -0,0 +1,72 @@
+import pytest
+
+import caching
+from caching import MISSING, SessionStore, UserCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(caching.time, "monotonic", fake)
+    return fake
+
+
+def test_refill_that_races_an_invalidation_is_dropped():
+    cache = UserCache(ttl=300, negative_ttl=30, max_entries=10)
+    version = cache.version("a@example.com")  # reader starts its query
+    cache.invalidate("a@example.com")  # a write lands meanwhile
+    cache.put("a@example.com", ("stale",), version)
+    assert cache.get("a@example.com") is MISSING
+
+    cache.put("a@example.com", ("fresh",), cache.version("a@example.com"))
+    assert cache.get("a@example.com") == ("fresh",)
+
+
+def test_negative_entries_expire_after_their_shorter_ttl(clock):
+    cache = UserCache(ttl=300, negative_ttl=30, max_entries=10)
+    cache.put("ghost@example.com", None, cache.version("ghost@example.com"))
+    cache.put("real@example.com", ("row",), cache.version("real@example.com"))
+
+    clock.now += 29
+    assert cache.get("ghost@example.com") is None
+    clock.now += 2
+    assert cache.get("ghost@example.com") is MISSING
+    assert cache.get("real@example.com") == ("row",)
+    assert cache.metrics()["negative_hits"] == 1
+
+
+def test_invalidation_map_is_trimmed_without_reviving_stale_refills():
+    cache = UserCache(ttl=300, negative_ttl=30, max_entries=2)
+    version = cache.version("old@example.com")
+    cache.invalidate("old@example.com")
+    cache.invalidate("b@example.com")
+    cache.invalidate("c@example.com")  # pushes old@ out of the map
+
+    assert len(cache.generations) == 2
+    assert "old@example.com" not in cache.generations
+    # The forgotten generation is folded into the floor, so the racing refill still loses
+    cache.put("old@example.com", ("stale",), version)
+    assert cache.get("old@example.com") is MISSING
+
+
+def test_session_store_caps_bytes_and_sweeps_idle_sessions(clock):
+    store = SessionStore(idle_seconds=60, max_bytes=500, sweep_interval=10)
+    store.put("s1", "first", "x" * 300)
+    store.put("s1", "second", "y" * 300)
+    assert store.get("s1", "first") is None
+    assert store.get("s1", "second") == "y" * 300
+
+    store.put("s2", "k", "v")
+    clock.now += 61
+    store.get("s2", "k")
+    store.sweep()
+    assert store.report()["sessions"] == 1
+    assert store.report()["evicted_idle_sessions"] == 1
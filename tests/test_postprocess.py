@@ -0,0 +1,89 @@
+import pytest
+
+from postprocess import clean_translation
+
+INPUT = "Why did the chicken cross the road? To get to the other side."
+PROMPT = (
+    "Translate or adapt the following joke or phrase into humor suitable for Japanese culture. "
+    "Maintain the spirit of the joke and make it funny and understandable to that culture.\n\n"
+    f"Input: {INPUT}\n\nTranslated Humor:"
+)
+
+
+@pytest.mark.parametrize("raw", [
+    "I can't help but laugh: my boss asked me to think outside the box, so I moved my desk to the hallway.",
+    "I won't do that again, said the salaryman, bowing to the vending machine that ate his coins.",
+    "I cannot write emails without bowing to my monitor first.",
+    "Sorry, not sorry: a very Canadian joke about moose.",
+])
+def test_jokes_that_open_like_refusals_are_kept(raw):
+    text, reason = clean_translation(raw, PROMPT, INPUT)
+    assert reason is None
+    assert text == raw
+
+
+@pytest.mark.parametrize("raw", [
+    "I'm sorry, but I can't help with that.",
+    "I am sorry, I cannot create content like this.",
+    "As an AI language model, I don't find jokes funny.",
+    "I can't help with that request.",
+    "I cannot fulfill this request.",
+    "I won't do that.",
+])
+def test_refusals_are_rejected(raw):
+    assert clean_translation(raw, PROMPT, INPUT) == (None, "refusal")
+
+
+def test_label_prefix_and_emphasis_are_stripped():
+    text, reason = clean_translation("Translation - *Why* did the ninja cross? _Nobody_ saw **him**.", PROMPT, INPUT)
+    assert reason is None
+    assert text == "Why did the ninja cross? Nobody saw him."
+
+
+def test_snake_case_is_not_treated_as_emphasis():
+    text, _ = clean_translation("The intern named every variable my_boss_is_watching, just in case.", PROMPT, INPUT)
+    assert "my_boss_is_watching" in text
+
+
+def test_prompt_echo_is_stripped_and_whitespace_normalized():
+    raw = PROMPT + ' "Why did the tanuki   cross the road?\n\n\n\nTo shapeshift."'
+    assert clean_translation(raw, PROMPT, INPUT) == ("Why did the tanuki cross the road?\n\nTo shapeshift.", None)
+
+
+@pytest.mark.parametrize("raw, reason", [
+    ("   ", "empty response"),
+    (INPUT, "echoed the prompt"),
+    ("### Translation:\n" + INPUT, "echoed the prompt"),
+])
+def test_unusable_responses_are_rejected(raw, reason):
+    assert clean_translation(raw, PROMPT, INPUT) == (None, reason)
+
+
+@pytest.mark.parametrize("raw", [
+    "Sure! Here's the adapted joke: Why did the tanuki cross the road? To shapeshift.",
+    "Here's a version for Japanese culture: Why did the tanuki cross the road? To shapeshift.",
+    "Of course. **Here is my take on it for a Japanese audience:** Why did the tanuki cross the road? To shapeshift.",
+])
+def test_chatty_preambles_are_stripped(raw):
+    assert clean_translation(raw, PROMPT, INPUT) == ("Why did the tanuki cross the road? To shapeshift.", None)
+
+
+def test_sure_without_a_label_is_kept():
+    raw = "Sure, said the boss, take the day off. Then he assigned me three reports."
+    assert clean_translation(raw, PROMPT, INPUT) == (raw, None)
+
+
+MARKDOWN_INPUT = "My *boss* said __hi__ to me"
+MARKDOWN_PROMPT = PROMPT.replace(INPUT, MARKDOWN_INPUT)
+
+
+def test_prompt_echo_with_markdown_in_the_joke_is_stripped():
+    raw = MARKDOWN_PROMPT + "\nMy *bucho* bowed so deeply that his hi reached me a day late."
+    text, reason = clean_translation(raw, MARKDOWN_PROMPT, MARKDOWN_INPUT)
+    assert reason is None
+    assert text == "My bucho bowed so deeply that his hi reached me a day late."
+
+
+@pytest.mark.parametrize("raw", [MARKDOWN_INPUT, "My boss said hi to me", "Translation: My **boss** said hi to me"])
+def test_markdown_input_echo_is_rejected(raw):
+    assert clean_translation(raw, MARKDOWN_PROMPT, MARKDOWN_INPUT) == (None, "echoed the prompt")